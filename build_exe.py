@@ -7,6 +7,16 @@ import subprocess
 import sys
 from pathlib import Path
 
+EXCLUDED_MODULES = [
+    "unittest",
+    "pydoc",
+    "pydoc_data",
+    "lib2to3",
+    "test",
+    "xml.dom",
+    "xmlrpc",
+]
+
 
 def main() -> None:
     """Invoke PyInstaller to build a single-file executable."""
@@ -20,8 +30,15 @@ def main() -> None:
         "--windowed",
         "--name",
         "mkv_resolution",
-        str(script),
     ]
+    # Stripping needs binutils' strip, which Windows does not normally have.
+    if sys.platform != "win32":
+        cmd.append("--strip")
+    # The one-file executable unpacks its whole archive on every launch, so
+    # leave out standard library packages the application never imports.
+    for module in EXCLUDED_MODULES:
+        cmd += ["--exclude-module", module]
+    cmd.append(str(script))
     subprocess.run(cmd, check=True)
 
 
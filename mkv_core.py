@@ -0,0 +1,689 @@
+"""Core probing logic for MKV video metadata.
+
+Reads the Matroska track headers (falling back to libmediainfo when
+pymediainfo is installed, then to ffprobe) to extract
+resolution, codec, frame rate, audio and subtitle languages and classifies the
+quality based on the width. Results are cached on disk between runs.
+"""
+
+from __future__ import annotations
+
+import bisect
+import functools
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable, Iterator
+
+try:
+    from pymediainfo import MediaInfo
+except ImportError:  # optional dependency
+    MediaInfo = None
+
+logger = logging.getLogger(__name__)
+
+# ffprobe runs in its own process, so the pool only waits on subprocesses and
+# is not limited by the GIL.
+MAX_WORKERS = min(8, os.cpu_count() or 4)
+
+QUALITY_BY_WIDTH: list[tuple[int, str]] = [
+    (3840, "4K"),
+    (2560, "2K"),
+    (1920, "FHD"),
+    (1280, "HD"),
+    (0, "SD"),
+]
+
+
+# Ascending thresholds for bisect; widths below the lowest one are "Unknown".
+_THRESHOLDS = tuple(threshold for threshold, _ in reversed(QUALITY_BY_WIDTH))
+_LABELS = ("Unknown",) + tuple(label for _, label in reversed(QUALITY_BY_WIDTH))
+
+
+@functools.lru_cache(maxsize=None)
+def classify(width: int) -> str:
+    """Return a quality label for the given width."""
+    return _LABELS[bisect.bisect_right(_THRESHOLDS, width)]
+
+
+def _cache_dir() -> Path:
+    """Return the per-user directory where probe results are cached."""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "mkv_resolution"
+
+
+# Bump whenever probing changes what is stored, so older entries are dropped.
+_CACHE_VERSION = 1
+
+
+class _ProbeCache:
+    """Persistent store of probe results keyed by path, size and mtime.
+
+    A file whose size or modification time changed is probed again and its
+    entry replaced. The connection is shared between the probing threads.
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        # Every probed file is committed on its own; with WAL and NORMAL
+        # synchronisation those commits do not each wait for an fsync.
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        with self._lock, self._conn:
+            if version != _CACHE_VERSION:
+                self._conn.execute("DROP TABLE IF EXISTS cache")
+                self._conn.execute(f"PRAGMA user_version = {_CACHE_VERSION}")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, json TEXT)"
+            )
+
+    def get(self, path: str, size: int, mtime: int) -> dict[str, Any] | None:
+        """Return the cached metadata for ``path`` or ``None`` on a miss.
+
+        Unreadable or incomplete entries count as misses and are overwritten
+        by the next probe.
+        """
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT json FROM cache WHERE path = ? AND size = ? AND mtime = ?",
+                    (path, size, mtime),
+                ).fetchone()
+            metadata = json.loads(row[0]) if row else None
+        except (sqlite3.Error, ValueError, TypeError) as exc:
+            logger.warning("Failed to read probe cache: %s", exc)
+            return None
+        if not isinstance(metadata, dict) or not metadata.keys() >= _METADATA_KEYS:
+            return None
+        return metadata
+
+    def put(self, path: str, size: int, mtime: int, metadata: dict[str, Any]) -> None:
+        """Store ``metadata`` for ``path``, replacing any older entry."""
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                    (path, size, mtime, json.dumps(metadata)),
+                )
+        except sqlite3.Error as exc:
+            logger.warning("Failed to write probe cache: %s", exc)
+
+
+_cache: _ProbeCache | None = None
+_cache_lock = threading.Lock()
+_cache_failed = False
+
+
+def _get_cache() -> _ProbeCache | None:
+    """Return the shared probe cache, opening it on first use.
+
+    ``None`` is returned when the cache cannot be opened; probing then simply
+    bypasses it.
+    """
+    global _cache, _cache_failed
+    with _cache_lock:
+        if _cache is None and not _cache_failed:
+            try:
+                _cache = _ProbeCache(_cache_dir() / "cache.sqlite")
+            except (OSError, sqlite3.Error) as exc:
+                logger.warning("Probe cache disabled: %s", exc)
+                _cache_failed = True
+        return _cache
+
+
+def _empty_metadata() -> dict[str, Any]:
+    """Return the metadata dictionary used when nothing is known."""
+    return {
+        "width": None,
+        "height": None,
+        "codec": None,
+        "fps": None,
+        "audio": [],
+        "subtitles": [],
+    }
+
+
+_METADATA_KEYS = frozenset(_empty_metadata())
+
+
+def get_video_metadata(path: Path) -> dict[str, Any]:
+    """Retrieve various metadata of a video.
+
+    The returned dictionary may contain the keys ``width``, ``height``,
+    ``codec``, ``fps``, ``audio`` (list of ``lang (codec)`` strings) and
+    ``subtitles`` (list of ``lang (codec)`` strings). Missing values are set
+    to ``None`` or an empty list.
+
+    Results are cached on disk, so ffprobe only runs for files that were not
+    seen before or changed since they were last probed.
+    """
+    try:
+        st = path.stat()
+    except OSError:
+        # Let ffprobe report the problem.
+        return _ffprobe_metadata(path) or _empty_metadata()
+
+    key = (str(path.absolute()), st.st_size, st.st_mtime_ns)
+    cache = _get_cache()
+    if cache is not None:
+        cached = cache.get(*key)
+        if cached is not None:
+            return cached
+
+    metadata = _probe(path)
+    if metadata is None:
+        return _empty_metadata()
+    if cache is not None:
+        cache.put(*key, metadata)
+    return metadata
+
+
+def _probe(path: Path) -> dict[str, Any] | None:
+    """Read the metadata of ``path`` without consulting the cache.
+
+    Matroska headers are parsed directly, which avoids spawning ffprobe for
+    most MKV files. Files the parser cannot handle go through libmediainfo
+    if it is available, and through ffprobe otherwise.
+    """
+    try:
+        return _parse_mkv_header(path)
+    except (OSError, ValueError) as exc:
+        logger.debug("Cannot read the header of %s: %s", path, exc)
+    if MediaInfo is not None:
+        try:
+            return _mediainfo_metadata(path)
+        except (OSError, ValueError) as exc:
+            logger.debug("MediaInfo cannot handle %s: %s", path, exc)
+    return _ffprobe_metadata(path)
+
+
+def _mediainfo_language(track: Any) -> str:
+    """Return the three-letter language code of a MediaInfo track.
+
+    MediaInfo reports two-letter codes, but lists the ISO 639-2 code, which
+    is what ffprobe and the Matroska header use, among the alternatives.
+    Tracks without a language are English, as in :func:`_parse_mkv_track`;
+    a language without a three-letter code is reported as ``und``.
+    """
+    if not track.language:
+        return "eng"
+    for name in track.other_language or []:
+        if len(name) == 3 and name.isalpha() and name.islower():
+            return name
+    return "und"
+
+
+def _mediainfo_metadata(path: Path) -> dict[str, Any]:
+    """Retrieve the metadata of a Matroska file using libmediainfo.
+
+    Raises :class:`OSError` when libmediainfo is missing and
+    :class:`ValueError` for anything that cannot be reported like ffprobe
+    would, in which case ffprobe should be used instead.
+    """
+    info = MediaInfo.parse(str(path))
+    general = info.general_tracks[0] if info.general_tracks else None
+    if general is None or general.format != "Matroska":
+        raise ValueError("not a Matroska file")
+
+    metadata = _empty_metadata()
+    for track in info.tracks:
+        if track.track_type == "Video":
+            if metadata["width"] is not None:
+                continue
+            if not track.width or not track.height:
+                raise ValueError("incomplete video track")
+            metadata["width"] = track.width
+            metadata["height"] = track.height
+            metadata["codec"] = _mkv_codec_name(track.codec_id or "")
+            if track.frame_rate:
+                fps = f"{float(track.frame_rate):.3f}"
+                metadata["fps"] = fps.rstrip("0").rstrip(".")
+        elif track.track_type in ("Audio", "Text"):
+            key = "audio" if track.track_type == "Audio" else "subtitles"
+            codec = _mkv_codec_name(track.codec_id or "")
+            metadata[key].append(f"{_mediainfo_language(track)} ({codec})")
+    return metadata
+
+
+# Display strings of the usual NTSC rates, as reported by ffprobe.
+_NTSC_FPS = {
+    (24000, 1001): "23.976",
+    (30000, 1001): "29.97",
+    (60000, 1001): "59.94",
+}
+
+
+def _format_fps(num: int, den: int) -> str:
+    """Return the frame rate ``num/den`` formatted for display."""
+    if num % den == 0:
+        return str(num // den)
+    fps = _NTSC_FPS.get((num, den))
+    if fps is not None:
+        return fps
+    return f"{num/den:.3f}".rstrip("0").rstrip(".")
+
+
+def _run_ffprobe(cmd: list[str]) -> bytes:
+    """Run ``cmd`` and return its raw standard output.
+
+    Where available, ``os.posix_spawnp`` is used directly, which skips the
+    bookkeeping :func:`subprocess.run` does for every call. Raises
+    :class:`subprocess.CalledProcessError` if the command fails.
+    """
+    if not hasattr(os, "posix_spawnp"):
+        result = subprocess.run(cmd, capture_output=True, check=True)
+        return result.stdout
+
+    # The pipe is created close-on-exec, so only the child's stdout keeps the
+    # write end open and concurrent spawns cannot hold it.
+    read_fd, write_fd = os.pipe()
+    try:
+        pid = os.posix_spawnp(
+            cmd[0],
+            cmd,
+            os.environ,
+            file_actions=[
+                (os.POSIX_SPAWN_DUP2, write_fd, 1),
+                (os.POSIX_SPAWN_OPEN, 2, os.devnull, os.O_WRONLY, 0),
+            ],
+        )
+    except BaseException:
+        os.close(read_fd)
+        raise
+    finally:
+        os.close(write_fd)
+
+    chunks = []
+    try:
+        while True:
+            chunk = os.read(read_fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(read_fd)
+        _, status = os.waitpid(pid, 0)
+
+    if os.WIFEXITED(status):
+        returncode = os.WEXITSTATUS(status)
+    else:
+        returncode = -os.WTERMSIG(status)
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd)
+    return b"".join(chunks)
+
+
+def _parse_int(value: str | None) -> int | None:
+    """Return ``value`` as an integer, or ``None`` if it is not one."""
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def _ffprobe_executable() -> str:
+    """Return the ffprobe command, resolved against PATH once per session.
+
+    Launching an absolute path spares every probe the PATH lookup.
+    """
+    return shutil.which("ffprobe") or "ffprobe"
+
+
+def _ffprobe_metadata(path: Path) -> dict[str, Any] | None:
+    """Retrieve the metadata of a video using ffprobe.
+
+    Returns ``None`` when ffprobe fails.
+    """
+    # Stream parameters are in the container header, so cap how much of the
+    # file ffprobe analyses (1 MB / 1 s) instead of its much larger defaults.
+    cmd = [
+        _ffprobe_executable(),
+        "-v",
+        "error",
+        "-analyzeduration",
+        "1000000",
+        "-probesize",
+        "1000000",
+        "-read_intervals",
+        "%+1",
+        "-show_entries",
+        "stream=codec_type,codec_name,width,height,avg_frame_rate:stream_tags=language",
+        "-of",
+        "compact=p=0",
+        str(path),
+    ]
+    metadata = _empty_metadata()
+    try:
+        # ffprobe always writes UTF-8, whatever the locale encoding is.
+        output = _run_ffprobe(cmd).decode("utf-8", "replace")
+    except (subprocess.SubprocessError, OSError) as exc:
+        logger.warning("Failed to probe %s: %s", path, exc)
+        return None
+
+    # One line per stream of "key=value" fields separated by "|"; tags are
+    # prefixed with "tag:" and fields that do not apply are left out.
+    for line in output.splitlines():
+        stream = dict(field.partition("=")[::2] for field in line.split("|"))
+        stype = stream.get("codec_type")
+        if stype == "video" and metadata["width"] is None:
+            metadata["width"] = _parse_int(stream.get("width"))
+            metadata["height"] = _parse_int(stream.get("height"))
+            metadata["codec"] = stream.get("codec_name")
+            rate = stream.get("avg_frame_rate")
+            if rate and rate != "0/0":
+                try:
+                    num, den = map(int, rate.split("/"))
+                    metadata["fps"] = _format_fps(num, den)
+                except (ValueError, ZeroDivisionError):
+                    pass
+        elif stype == "audio":
+            lang = stream.get("tag:language", "und")
+            codec = stream.get("codec_name")
+            metadata["audio"].append(
+                f"{lang} ({codec})" if codec else lang
+            )
+        elif stype == "subtitle":
+            lang = stream.get("tag:language", "und")
+            codec = stream.get("codec_name")
+            metadata["subtitles"].append(
+                f"{lang} ({codec})" if codec else lang
+            )
+    return metadata
+
+
+# Matroska element IDs, see https://www.matroska.org/technical/elements.html
+_EBML_HEADER = 0x1A45DFA3
+_EBML_DOCTYPE = 0x4282
+_MKV_SEGMENT = 0x18538067
+_MKV_CLUSTER = 0x1F43B675
+_MKV_TRACKS = 0x1654AE6B
+_MKV_TRACK_ENTRY = 0xAE
+_MKV_TRACK_TYPE = 0x83
+_MKV_CODEC_ID = 0x86
+_MKV_LANGUAGE = 0x22B59C
+_MKV_DEFAULT_DURATION = 0x23E383
+_MKV_VIDEO = 0xE0
+_MKV_PIXEL_WIDTH = 0xB0
+_MKV_PIXEL_HEIGHT = 0xBA
+
+_MKV_TRACK_KINDS = {1: "video", 2: "audio", 17: "subtitle"}
+
+# Matroska codec ID prefixes and the matching ffprobe codec names, so both
+# probing paths report the same labels. Unlisted codecs fall back to ffprobe.
+_MKV_CODECS: list[tuple[str, str]] = [
+    ("V_MPEG4/ISO/AVC", "h264"),
+    ("V_MPEGH/ISO/HEVC", "hevc"),
+    ("V_AV1", "av1"),
+    ("V_VP8", "vp8"),
+    ("V_VP9", "vp9"),
+    ("V_MPEG4/ISO/ASP", "mpeg4"),
+    ("V_MPEG2", "mpeg2video"),
+    ("A_AAC", "aac"),
+    ("A_AC3", "ac3"),
+    ("A_EAC3", "eac3"),
+    ("A_DTS", "dts"),
+    ("A_TRUEHD", "truehd"),
+    ("A_FLAC", "flac"),
+    ("A_OPUS", "opus"),
+    ("A_VORBIS", "vorbis"),
+    ("A_MPEG/L3", "mp3"),
+    ("A_MPEG/L2", "mp2"),
+    ("S_TEXT/UTF8", "subrip"),
+    ("S_TEXT/ASS", "ass"),
+    ("S_TEXT/SSA", "ass"),
+    ("S_TEXT/WEBVTT", "webvtt"),
+    ("S_HDMV/PGS", "hdmv_pgs_subtitle"),
+    ("S_VOBSUB", "dvd_subtitle"),
+    ("S_DVBSUB", "dvb_subtitle"),
+]
+
+# Upper bound for string elements; anything larger means a corrupt header.
+_MKV_MAX_STRING = 1024
+
+
+def _read_vint(f: BinaryIO, keep_marker: bool = False) -> int | None:
+    """Read an EBML variable length integer from ``f``.
+
+    Element IDs keep their length marker bit, sizes do not. ``None`` is
+    returned for the reserved "unknown size" value.
+    """
+    first = f.read(1)
+    if not first:
+        raise EOFError
+    length = 9 - first[0].bit_length()
+    if length > 8:
+        raise ValueError("invalid EBML integer")
+    value = first[0] if keep_marker else first[0] & (0xFF >> length)
+    rest = f.read(length - 1)
+    if len(rest) != length - 1:
+        raise ValueError("truncated EBML integer")
+    value = (value << 8 * len(rest)) | int.from_bytes(rest, "big")
+    if not keep_marker and value == (1 << 7 * length) - 1:
+        return None
+    return value
+
+
+def _iter_elements(f: BinaryIO, end: int | None) -> Iterator[tuple[int, int | None]]:
+    """Yield ``(id, size)`` for each element until offset ``end``.
+
+    The caller may read the element's data; the file position is moved past
+    the element before the next one is read. ``end`` may be ``None`` to read
+    until the end of the file. Only segments and clusters may have an unknown
+    size, reported as ``None``.
+    """
+    while end is None or f.tell() < end:
+        try:
+            element_id = _read_vint(f, keep_marker=True)
+        except EOFError:
+            return
+        try:
+            size = _read_vint(f)
+        except EOFError:
+            raise ValueError("truncated element") from None
+        if size is None and element_id not in (_MKV_SEGMENT, _MKV_CLUSTER):
+            raise ValueError("unexpected element of unknown size")
+        start = f.tell()
+        yield element_id, size
+        if size is None:
+            raise ValueError("cannot skip element of unknown size")
+        f.seek(start + size)
+
+
+def _read_uint(f: BinaryIO, size: int) -> int:
+    """Read an unsigned integer element's ``size`` bytes of data."""
+    if size > 8:
+        raise ValueError("oversized integer element")
+    return int.from_bytes(f.read(size), "big")
+
+
+def _read_string(f: BinaryIO, size: int) -> str:
+    """Read a string element's ``size`` bytes of data."""
+    if size > _MKV_MAX_STRING:
+        raise ValueError("oversized string element")
+    return f.read(size).rstrip(b"\0").decode("utf-8", "replace")
+
+
+def _mkv_codec_name(codec_id: str) -> str:
+    """Return the ffprobe codec name of the Matroska codec ``codec_id``."""
+    for prefix, name in _MKV_CODECS:
+        if codec_id.startswith(prefix):
+            return name
+    raise ValueError(f"unknown codec {codec_id!r}")
+
+
+def _parse_mkv_track(f: BinaryIO, end: int) -> dict[str, Any]:
+    """Return the fields of a ``TrackEntry`` element ending at ``end``."""
+    # Language defaults to English according to the Matroska specification.
+    track: dict[str, Any] = {"language": "eng"}
+    for element_id, size in _iter_elements(f, end):
+        if element_id == _MKV_TRACK_TYPE:
+            track["type"] = _read_uint(f, size)
+        elif element_id == _MKV_CODEC_ID:
+            track["codec_id"] = _read_string(f, size)
+        elif element_id == _MKV_LANGUAGE:
+            track["language"] = _read_string(f, size)
+        elif element_id == _MKV_DEFAULT_DURATION:
+            track["default_duration"] = _read_uint(f, size)
+        elif element_id == _MKV_VIDEO:
+            for child_id, child_size in _iter_elements(f, f.tell() + size):
+                if child_id == _MKV_PIXEL_WIDTH:
+                    track["width"] = _read_uint(f, child_size)
+                elif child_id == _MKV_PIXEL_HEIGHT:
+                    track["height"] = _read_uint(f, child_size)
+    return track
+
+
+def _find_mkv_tracks(f: BinaryIO) -> list[dict[str, Any]]:
+    """Return the track entries of the Matroska file ``f``.
+
+    Only the header is read: parsing stops at the ``Tracks`` element, which
+    muxers write before the first ``Cluster`` of media data.
+    """
+    for element_id, size in _iter_elements(f, None):
+        if element_id == _EBML_HEADER:
+            doctype = None
+            for child_id, child_size in _iter_elements(f, f.tell() + size):
+                if child_id == _EBML_DOCTYPE:
+                    doctype = _read_string(f, child_size)
+            if doctype not in ("matroska", "webm"):
+                raise ValueError(f"unsupported document type {doctype!r}")
+        elif element_id == _MKV_SEGMENT:
+            end = None if size is None else f.tell() + size
+            for child_id, child_size in _iter_elements(f, end):
+                if child_id == _MKV_CLUSTER:
+                    break
+                if child_id == _MKV_TRACKS:
+                    return [
+                        _parse_mkv_track(f, f.tell() + entry_size)
+                        for entry_id, entry_size in _iter_elements(
+                            f, f.tell() + child_size
+                        )
+                        if entry_id == _MKV_TRACK_ENTRY
+                    ]
+            raise ValueError("no Tracks element before the media data")
+        else:
+            raise ValueError("not a Matroska file")
+    raise ValueError("no Segment element")
+
+
+def _parse_mkv_header(path: Path) -> dict[str, Any]:
+    """Retrieve the metadata of a Matroska file by reading its header.
+
+    Raises :class:`ValueError` when the file is not Matroska or uses
+    something this reader does not handle, in which case ffprobe should be
+    used instead.
+    """
+    with path.open("rb") as f:
+        tracks = _find_mkv_tracks(f)
+
+    metadata = _empty_metadata()
+    for track in tracks:
+        kind = _MKV_TRACK_KINDS.get(track.get("type"))
+        if kind is None:
+            continue
+        codec = _mkv_codec_name(track.get("codec_id", ""))
+        if kind == "video":
+            if metadata["width"] is not None:
+                continue
+            duration = track.get("default_duration")
+            if "width" not in track or "height" not in track or not duration:
+                raise ValueError("incomplete video track")
+            metadata["width"] = track["width"]
+            metadata["height"] = track["height"]
+            metadata["codec"] = codec
+            metadata["fps"] = _format_fps(1_000_000_000, duration)
+        else:
+            key = "audio" if kind == "audio" else "subtitles"
+            metadata[key].append(f"{track['language']} ({codec})")
+    return metadata
+
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+# Futures handed out by probe_many that have not finished yet.
+_pending: set[Future] = set()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Return the probe pool shared by every batch, creating it on first use.
+
+    Its worker threads are kept for the whole session instead of being
+    started and joined again for every selection.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_WORKERS, thread_name_prefix="probe"
+            )
+        return _executor
+
+
+def warm_up() -> None:
+    """Prepare probing in the background ahead of the first selection.
+
+    Starts a pool worker, opens the probe cache and locates ffprobe so the
+    first batch does not pay for it.
+    """
+
+    def prepare() -> None:
+        _get_cache()
+        _ffprobe_executable()
+
+    _get_executor().submit(prepare)
+
+
+def probe_many(paths: Iterable[Path]) -> list[Future[dict[str, Any]]]:
+    """Start probing each of ``paths`` and return their futures, in order.
+
+    The files are probed concurrently on the shared pool. A file that fails
+    to probe only affects its own future.
+    """
+    executor = _get_executor()
+    futures = []
+    for path in paths:
+        future = executor.submit(get_video_metadata, path)
+        with _executor_lock:
+            _pending.add(future)
+        future.add_done_callback(_forget)
+        futures.append(future)
+    return futures
+
+
+def _forget(future: Future) -> None:
+    """Drop a finished probe from the pending set."""
+    with _executor_lock:
+        _pending.discard(future)
+
+
+def shutdown() -> None:
+    """Stop the probe pool without waiting for queued probes.
+
+    Probes that have not started are cancelled, so the interpreter only
+    waits for the ones already running when it exits.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+        pending = list(_pending)
+    for future in pending:
+        future.cancel()
+    if executor is not None:
+        executor.shutdown(wait=False)
@@ -1,137 +1,128 @@
 """GUI application for inspecting MKV video metadata.
 
-Uses ffprobe to extract resolution, codec, frame rate, audio and subtitle
-languages and classifies the quality based on the width. A simple Tkinter
-interface allows selecting multiple MKV files and displays these details in a
-table.
+The metadata is read by :mod:`mkv_core`. A simple Tkinter interface allows
+selecting multiple MKV files and displays their resolution, frame rate,
+codecs, audio and subtitle languages and quality in a table.
 """
 
 from __future__ import annotations
 
-import json
 import logging
-import subprocess
+import queue
 import sys
+import threading
+from concurrent.futures import CancelledError
 from pathlib import Path
 from typing import Any, Iterable
 
 import tkinter as tk
 from tkinter import filedialog, ttk
 
-logger = logging.getLogger(__name__)
+from mkv_core import classify, probe_many, shutdown, warm_up
 
-QUALITY_BY_WIDTH: list[tuple[int, str]] = [
-    (3840, "4K"),
-    (2560, "2K"),
-    (1920, "FHD"),
-    (1280, "HD"),
-    (0, "SD"),
-]
+logger = logging.getLogger(__name__)
 
+# How often the Tk thread checks for newly probed rows, in milliseconds.
+POLL_INTERVAL_MS = 100
 
-def classify(width: int) -> str:
-    """Return a quality label for the given width."""
-    for threshold, label in QUALITY_BY_WIDTH:
-        if width >= threshold:
-            return label
-    return "Unknown"
+# Maximum number of rows filled in before the tree view is allowed to redraw.
+INSERT_BATCH_SIZE = 50
 
 
-def get_video_metadata(path: Path) -> dict[str, Any]:
-    """Retrieve various metadata of a video using ffprobe.
+def _format_row(name: str, metadata: dict[str, Any] | None) -> tuple[str, ...]:
+    """Return the tree view values describing the file called ``name``.
 
-    The returned dictionary may contain the keys ``width``, ``height``,
-    ``codec``, ``fps``, ``audio`` (list of ``lang (codec)`` strings) and
-    ``subtitles`` (list of ``lang (codec)`` strings). Missing values are set
-    to ``None`` or an empty list.
+    ``metadata`` is ``None`` when the file could not be probed at all.
     """
-    cmd = [
-        "ffprobe",
-        "-v",
-        "error",
-        "-show_entries",
-        "stream=index,codec_type,codec_name,width,height,avg_frame_rate,tags",
-        "-of",
-        "json",
-        str(path),
-    ]
-    metadata: dict[str, Any] = {
-        "width": None,
-        "height": None,
-        "codec": None,
-        "fps": None,
-        "audio": [],
-        "subtitles": [],
-    }
+    if metadata is None:
+        return (name, "Unknown", "-", "-", "-", "-", "-")
+    width = metadata["width"]
+    height = metadata["height"]
+    if width is None or height is None:
+        return (name, "Unknown", "-", "-", "-", "-", "-")
+    quality = classify(width)
+    resolution = f"{width}x{height}"
+    fps = metadata["fps"] or "-"
+    codec = metadata["codec"] or "-"
+    audio = ", ".join(metadata["audio"]) or "-"
+    subs = ", ".join(metadata["subtitles"]) or "-"
+    return (
+        name,
+        resolution,
+        fps,
+        codec,
+        audio,
+        subs,
+        quality,
+    )
+
+
+def _probe_files(files: list[str], rows: queue.Queue) -> None:
+    """Probe ``files`` concurrently and push their rows onto ``rows``.
+
+    Runs in a background thread. Each row is pushed as ``(index, values)``
+    where ``index`` is the file's position in ``files``; ``None`` is pushed
+    once every file has been handled.
+    """
+    paths = [Path(file_path) for file_path in files]
+    # Probe one directory after the other so consecutive probes find its
+    # entries already in the OS cache.
+    order = sorted(range(len(paths)), key=lambda i: (paths[i].parent, paths[i]))
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        data = json.loads(result.stdout)
-    except (subprocess.SubprocessError, json.JSONDecodeError, FileNotFoundError) as exc:
-        logger.warning("Failed to probe %s: %s", path, exc)
-        return metadata
-
-    for stream in data.get("streams", []):
-        stype = stream.get("codec_type")
-        if stype == "video" and metadata["width"] is None:
-            metadata["width"] = stream.get("width")
-            metadata["height"] = stream.get("height")
-            metadata["codec"] = stream.get("codec_name")
-            rate = stream.get("avg_frame_rate")
-            if rate and rate != "0/0":
-                try:
-                    num, den = map(int, rate.split("/"))
-                    metadata["fps"] = f"{num/den:.3f}".rstrip("0").rstrip(".")
-                except ValueError:
-                    pass
-        elif stype == "audio":
-            tags = stream.get("tags", {})
-            lang = tags.get("language", "und")
-            codec = stream.get("codec_name")
-            metadata["audio"].append(
-                f"{lang} ({codec})" if codec else lang
-            )
-        elif stype == "subtitle":
-            tags = stream.get("tags", {})
-            lang = tags.get("language", "und")
-            codec = stream.get("codec_name")
-            metadata["subtitles"].append(
-                f"{lang} ({codec})" if codec else lang
-            )
-    return metadata
+        futures = probe_many(paths[i] for i in order)
+        for index, future in zip(order, futures):
+            name = paths[index].name
+            try:
+                values = _format_row(name, future.result())
+            except CancelledError:
+                # The app is quitting and the batch is being abandoned.
+                return
+            except Exception:
+                # One unreadable file must not cost the rest of the batch.
+                logger.exception("Failed to probe %s", paths[index])
+                values = _format_row(name, None)
+            rows.put((index, values))
+    finally:
+        rows.put(None)
 
 
 def _update_list(tree: ttk.Treeview, files: Iterable[str]) -> None:
-    """Populate the tree view with metadata info for each file."""
-    for file_path in files:
-        metadata = get_video_metadata(Path(file_path))
-        width = metadata["width"]
-        height = metadata["height"]
-        if width is None or height is None:
-            tree.insert(
-                "",
-                tk.END,
-                values=(Path(file_path).name, "Unknown", "-", "-", "-", "-", "-"),
-            )
-            continue
-        quality = classify(width)
-        resolution = f"{width}x{height}"
-        fps = metadata["fps"] or "-"
-        codec = metadata["codec"] or "-"
-        audio = ", ".join(metadata["audio"]) or "-"
-        subs = ", ".join(metadata["subtitles"]) or "-"
-        tree.insert(
-            "",
-            tk.END,
-            values=(
-                Path(file_path).name,
-                resolution,
-                fps,
-                codec,
-                audio,
-                subs,
-                quality,
-            ),
-        )
+    """Populate the tree view with metadata info for each file.
+
+    Probing happens in a background thread so the window stays responsive;
+    rows are filled in from the Tk thread as they become available, at most
+    ``INSERT_BATCH_SIZE`` at a time so cached results do not stall redraws.
+    A placeholder row is added for every file up front and filled in when its
+    result arrives, so rows keep the order of ``files`` even though they are
+    not probed in it, and overlapping batches do not mix.
+    """
+    files = list(files)
+    iids = [
+        tree.insert("", tk.END, values=(Path(file_path).name, "Probing…"))
+        for file_path in files
+    ]
+    rows: queue.Queue = queue.Queue()
+    threading.Thread(
+        target=_probe_files, args=(files, rows), daemon=True
+    ).start()
+
+    def drain() -> None:
+        # Tk is not thread-safe: only touch the tree from the Tk thread.
+        for _ in range(INSERT_BATCH_SIZE):
+            try:
+                row = rows.get_nowait()
+            except queue.Empty:
+                tree.after(POLL_INTERVAL_MS, drain)
+                return
+            if row is None:
+                return
+            index, values = row
+            tree.item(iids[index], values=values)
+        # More rows may be waiting: redraw, then continue right away.
+        tree.update_idletasks()
+        tree.after(0, drain)
+
+    drain()
 
 
 def build_ui(initial_paths: Iterable[str]) -> tk.Tk:
@@ -139,9 +130,11 @@ def build_ui(initial_paths: Iterable[str]) -> tk.Tk:
     root = tk.Tk()
     root.title("MKV Resolution Checker")
 
-    style = ttk.Style(root)
-    if sys.platform == "darwin" and "aqua" in style.theme_names():
-        style.theme_use("aqua")
+    # The theme is only changed on macOS; elsewhere skip the style lookups.
+    if sys.platform == "darwin":
+        style = ttk.Style(root)
+        if "aqua" in style.theme_names():
+            style.theme_use("aqua")
 
     columns = ("file", "resolution", "fps", "video", "audio", "subs", "quality")
     tree = ttk.Treeview(root, columns=columns, show="headings")
@@ -196,8 +189,12 @@ def build_ui(initial_paths: Iterable[str]) -> tk.Tk:
 
 def main(initial_paths: Iterable[str]) -> None:
     """Run the GUI application."""
+    warm_up()
     root = build_ui(initial_paths)
-    root.mainloop()
+    try:
+        root.mainloop()
+    finally:
+        shutdown()
 
 
 def cli() -> None:
@@ -0,0 +1,328 @@
+"""Tests for :mod:`mkv_core` and the row handling in :mod:`mkv_resolution`."""
+
+from __future__ import annotations
+
+import io
+import subprocess
+import tempfile
+import time
+import unittest
+import unittest.mock
+from concurrent.futures import Future
+from pathlib import Path
+
+import mkv_core
+import mkv_resolution
+
+UNKNOWN_SIZE = b"\x01\xff\xff\xff\xff\xff\xff\xff"
+
+
+def _size(n: int) -> bytes:
+    """Encode ``n`` as an EBML size."""
+    for length in range(1, 9):
+        if n < (1 << 7 * length) - 1:
+            return ((1 << 7 * length) | n).to_bytes(length, "big")
+    raise ValueError(n)
+
+
+def _element(element_id: int, data: bytes, unknown_size: bool = False) -> bytes:
+    """Encode an EBML element."""
+    id_bytes = element_id.to_bytes((element_id.bit_length() + 7) // 8, "big")
+    return id_bytes + (UNKNOWN_SIZE if unknown_size else _size(len(data))) + data
+
+
+def _uint(element_id: int, value: int) -> bytes:
+    """Encode an unsigned integer element."""
+    return _element(element_id, value.to_bytes(4, "big"))
+
+
+def _string(element_id: int, value: str) -> bytes:
+    """Encode a string element."""
+    return _element(element_id, value.encode())
+
+
+def _track(kind: int, codec_id: str, **fields: int | str) -> bytes:
+    """Encode a ``TrackEntry`` element."""
+    data = _uint(mkv_core._MKV_TRACK_TYPE, kind)
+    data += _string(mkv_core._MKV_CODEC_ID, codec_id)
+    if "language" in fields:
+        data += _string(mkv_core._MKV_LANGUAGE, fields["language"])
+    if "duration" in fields:
+        data += _uint(mkv_core._MKV_DEFAULT_DURATION, fields["duration"])
+    if "width" in fields:
+        data += _element(
+            mkv_core._MKV_VIDEO,
+            _uint(mkv_core._MKV_PIXEL_WIDTH, fields["width"])
+            + _uint(mkv_core._MKV_PIXEL_HEIGHT, fields["height"]),
+        )
+    return _element(mkv_core._MKV_TRACK_ENTRY, data)
+
+
+HEADER = _element(mkv_core._EBML_HEADER, _string(mkv_core._EBML_DOCTYPE, "matroska"))
+
+TRACKS = _element(
+    mkv_core._MKV_TRACKS,
+    _track(1, "V_MPEGH/ISO/HEVC", width=3840, height=2160, duration=41708333)
+    + _track(2, "A_AAC/MPEG4/LC", language="jpn")
+    + _track(17, "S_TEXT/UTF8"),
+)
+
+CLUSTER = _element(mkv_core._MKV_CLUSTER, b"\0" * 64, unknown_size=True)
+
+
+def _mkv(segment: bytes, unknown_size: bool = False) -> bytes:
+    """Encode a Matroska file whose segment contains ``segment``."""
+    return HEADER + _element(mkv_core._MKV_SEGMENT, segment, unknown_size)
+
+
+class FindTracksTest(unittest.TestCase):
+    def _tracks(self, data: bytes) -> list:
+        return mkv_core._find_mkv_tracks(io.BytesIO(data))
+
+    def test_reads_tracks(self) -> None:
+        tracks = self._tracks(_mkv(TRACKS + CLUSTER))
+        self.assertEqual(
+            tracks,
+            [
+                {
+                    "language": "eng",
+                    "type": 1,
+                    "codec_id": "V_MPEGH/ISO/HEVC",
+                    "default_duration": 41708333,
+                    "width": 3840,
+                    "height": 2160,
+                },
+                {"language": "jpn", "type": 2, "codec_id": "A_AAC/MPEG4/LC"},
+                {"language": "eng", "type": 17, "codec_id": "S_TEXT/UTF8"},
+            ],
+        )
+
+    def test_segment_of_unknown_size(self) -> None:
+        tracks = self._tracks(_mkv(TRACKS + CLUSTER, unknown_size=True))
+        self.assertEqual(len(tracks), 3)
+
+    def test_tracks_after_cluster(self) -> None:
+        data = _mkv(_element(mkv_core._MKV_CLUSTER, b"\0" * 8) + TRACKS)
+        with self.assertRaises(ValueError):
+            self._tracks(data)
+
+    def test_unknown_size_outside_segment_and_cluster(self) -> None:
+        data = _mkv(_element(mkv_core._MKV_TRACKS, b"", unknown_size=True))
+        with self.assertRaises(ValueError):
+            self._tracks(data)
+
+    def test_truncated_file(self) -> None:
+        data = _mkv(TRACKS + CLUSTER)
+        for end in (4, len(HEADER) + 4, len(HEADER) + 20):
+            with self.subTest(end=end), self.assertRaises(ValueError):
+                self._tracks(data[:end])
+
+    def test_empty_file(self) -> None:
+        with self.assertRaises(ValueError):
+            self._tracks(b"")
+
+    def test_other_doctype(self) -> None:
+        header = _element(mkv_core._EBML_HEADER, _string(mkv_core._EBML_DOCTYPE, "x"))
+        with self.assertRaises(ValueError):
+            self._tracks(header + TRACKS)
+
+
+class ReadVintTest(unittest.TestCase):
+    def test_sizes(self) -> None:
+        self.assertEqual(mkv_core._read_vint(io.BytesIO(b"\x81")), 1)
+        self.assertEqual(mkv_core._read_vint(io.BytesIO(b"\x40\x02")), 2)
+        self.assertIsNone(mkv_core._read_vint(io.BytesIO(b"\xff")))
+        self.assertIsNone(mkv_core._read_vint(io.BytesIO(UNKNOWN_SIZE)))
+
+    def test_element_id_keeps_marker(self) -> None:
+        data = io.BytesIO(b"\x1a\x45\xdf\xa3")
+        self.assertEqual(mkv_core._read_vint(data, keep_marker=True), 0x1A45DFA3)
+
+    def test_invalid(self) -> None:
+        with self.assertRaises(ValueError):
+            mkv_core._read_vint(io.BytesIO(b"\x00"))
+        with self.assertRaises(ValueError):
+            mkv_core._read_vint(io.BytesIO(b"\x40"))
+
+
+class ParseHeaderTest(unittest.TestCase):
+    def test_metadata(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "video.mkv"
+            path.write_bytes(_mkv(TRACKS + CLUSTER))
+            metadata = mkv_core._parse_mkv_header(path)
+        self.assertEqual(
+            metadata,
+            {
+                "width": 3840,
+                "height": 2160,
+                "codec": "hevc",
+                "fps": "23.976",
+                "audio": ["jpn (aac)"],
+                "subtitles": ["eng (subrip)"],
+            },
+        )
+
+
+FFPROBE_OUTPUT = (
+    "codec_name=h264|codec_type=video|width=1920|height=1080|"
+    "avg_frame_rate=24000/1001\n"
+    "codec_name=aac|codec_type=audio|tag:language=jpn\n"
+    "codec_name=ac3|codec_type=audio\n"
+    "codec_name=subrip|codec_type=subtitle|tag:language=fre\n"
+).encode()
+
+
+class FfprobeMetadataTest(unittest.TestCase):
+    def test_parses_compact_output(self) -> None:
+        with unittest.mock.patch.object(
+            mkv_core, "_run_ffprobe", return_value=FFPROBE_OUTPUT
+        ):
+            metadata = mkv_core._ffprobe_metadata(Path("video.mkv"))
+        self.assertEqual(
+            metadata,
+            {
+                "width": 1920,
+                "height": 1080,
+                "codec": "h264",
+                "fps": "23.976",
+                "audio": ["jpn (aac)", "und (ac3)"],
+                "subtitles": ["fre (subrip)"],
+            },
+        )
+
+    def test_failure(self) -> None:
+        error = subprocess.CalledProcessError(1, ["ffprobe"])
+        with unittest.mock.patch.object(
+            mkv_core, "_run_ffprobe", side_effect=error
+        ), self.assertLogs(mkv_core.logger, "WARNING"):
+            self.assertIsNone(mkv_core._ffprobe_metadata(Path("video.mkv")))
+
+
+class ClassifyTest(unittest.TestCase):
+    def test_boundaries(self) -> None:
+        cases = {-1: "Unknown", 0: "SD", 1279: "SD", 1280: "HD", 3840: "4K"}
+        for width, label in cases.items():
+            with self.subTest(width=width):
+                self.assertEqual(mkv_core.classify(width), label)
+
+
+class FormatFpsTest(unittest.TestCase):
+    def test_whole_numbers(self) -> None:
+        self.assertEqual(mkv_core._format_fps(25, 1), "25")
+        self.assertEqual(mkv_core._format_fps(1_000_000_000, 40_000_000), "25")
+
+    def test_ntsc(self) -> None:
+        self.assertEqual(mkv_core._format_fps(24000, 1001), "23.976")
+        self.assertEqual(mkv_core._format_fps(30000, 1001), "29.97")
+
+    def test_fallback(self) -> None:
+        self.assertEqual(mkv_core._format_fps(1_000_000_000, 41_708_333), "23.976")
+        self.assertEqual(mkv_core._format_fps(25, 2), "12.5")
+
+
+class ProbeCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db_path = Path(tmp.name) / "cache.sqlite"
+        self.cache = mkv_core._ProbeCache(self.db_path)
+        self.addCleanup(self.cache._conn.close)
+
+    def _store(self, payload: str) -> None:
+        with self.cache._conn:
+            self.cache._conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                ("video.mkv", 1, 2, payload),
+            )
+
+    def test_round_trip(self) -> None:
+        metadata = mkv_core._empty_metadata()
+        metadata["width"] = 1920
+        self.cache.put("video.mkv", 1, 2, metadata)
+        self.assertEqual(self.cache.get("video.mkv", 1, 2), metadata)
+        self.assertIsNone(self.cache.get("video.mkv", 1, 3))
+
+    def test_corrupt_row_is_a_miss(self) -> None:
+        self._store("{not json")
+        with self.assertLogs(mkv_core.logger, "WARNING"):
+            self.assertIsNone(self.cache.get("video.mkv", 1, 2))
+
+    def test_incomplete_row_is_a_miss(self) -> None:
+        self._store('{"width": 1920}')
+        self.assertIsNone(self.cache.get("video.mkv", 1, 2))
+
+    def test_other_version_is_dropped(self) -> None:
+        self.cache.put("video.mkv", 1, 2, mkv_core._empty_metadata())
+        self.cache._conn.execute("PRAGMA user_version = 0")
+        reopened = mkv_core._ProbeCache(self.db_path)
+        self.addCleanup(reopened._conn.close)
+        self.assertIsNone(reopened.get("video.mkv", 1, 2))
+
+
+class _FakeTree:
+    """Minimal stand-in for the tree view used by ``_update_list``."""
+
+    def __init__(self) -> None:
+        self.values: dict[str, tuple] = {}
+        self.order: list[str] = []
+        self.callbacks: list = []
+
+    def insert(self, parent: str, index: str, values: tuple) -> str:
+        iid = f"I{len(self.order)}"
+        self.values[iid] = values
+        self.order.append(iid)
+        return iid
+
+    def item(self, iid: str, values: tuple) -> None:
+        self.values[iid] = values
+
+    def after(self, delay: int, callback) -> None:
+        self.callbacks.append(callback)
+
+    def update_idletasks(self) -> None:
+        pass
+
+    def run(self) -> None:
+        deadline = time.monotonic() + 5
+        while self.callbacks and time.monotonic() < deadline:
+            time.sleep(0.001)
+            self.callbacks.pop(0)()
+
+    def names(self) -> list[str]:
+        return [self.values[iid][0] for iid in self.order]
+
+
+def _fake_probe_many(paths) -> list[Future]:
+    """Return finished futures whose width is encoded in the file name."""
+    futures = []
+    for path in paths:
+        metadata = mkv_core._empty_metadata()
+        metadata["width"] = int(path.stem.split("_")[1])
+        metadata["height"] = 1
+        future: Future = Future()
+        future.set_result(metadata)
+        futures.append(future)
+    return futures
+
+
+class UpdateListTest(unittest.TestCase):
+    def test_overlapping_batches_keep_their_order(self) -> None:
+        tree = _FakeTree()
+        first = [f"/z/a{i}_{1280 + i}.mkv" for i in range(6)]
+        second = [f"/a/b{i}_{i}.mkv" for i in range(3)]
+        with unittest.mock.patch.object(
+            mkv_resolution, "probe_many", _fake_probe_many
+        ):
+            mkv_resolution._update_list(tree, first)
+            mkv_resolution._update_list(tree, second)
+            tree.run()
+        self.assertEqual(tree.names(), [Path(p).name for p in first + second])
+        self.assertEqual(
+            [tree.values[iid][1] for iid in tree.order],
+            [f"{1280 + i}x1" for i in range(6)] + [f"{i}x1" for i in range(3)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()